@@ -0,0 +1,133 @@
+import dataclasses
+import re
+import timeit
+import tracemalloc
+from datetime import date, datetime
+from main import Contact
+
+
+@dataclasses.dataclass
+class LegacyContact(object):
+    # Contact as it was: reflection in __post_init__, regex per call
+    forename: str
+    midname: str
+    surname: str
+    suffix: str
+    house: int
+    street: str
+    apt: str
+    city: str
+    state: str
+    zipcode: int
+    phone: str
+    email: str
+    dob: date
+    ctyvid: int
+    stvid: int
+    cksum: str
+
+    @staticmethod
+    def normalize(s):
+        nalpha = re.compile(r'[^a-zA-Z0-9\s]')
+        return nalpha.sub('', ' '.join(str(s).strip().split())).title()
+
+    def __post_init__(self):
+        for field in dataclasses.fields(self):
+            if field.type is str:
+                normalize = self.__class__.normalize
+                if field.name == 'email':
+                    normalize = str.lower
+                elif field.name == 'state':
+                    normalize = str.upper
+                normalized = normalize(getattr(self, field.name))
+                setattr(self, field.name, normalized)
+
+    @classmethod
+    def from_harvest(cls, harvest, cksum):
+        name = harvest['name']
+        name_fields = ('first', 'last', 'middle', 'title')
+        forename, surname, mdlname, suffix = (
+            name[field] for field in name_fields)
+        address = harvest['address']
+        address_fields = ('house', 'street', 'apartment',
+                          'city', 'state', 'zip')
+        house, street, apartment, city, state, zipcode = (
+            address[field] for field in address_fields)
+
+        dob, phones, emails = (
+            harvest[field] for field in ('dob', 'phones', 'emails'))
+        phone = phones[0] if len(phones) > 0 else ''
+        email = emails[0] if len(emails) > 0 else ''
+        ctyvid = harvest.get('monroe_county_id')
+        stvid = harvest.get('ny_state_id')
+        return cls(forename, mdlname, surname, suffix,
+                   house, street, apartment, city, state, zipcode,
+                   phone, email, dob, ctyvid, stvid, cksum)
+
+
+def harvest(i):
+    return {
+        'name': {'first': f" o'neil-{i} ", 'last': 'van  der berg',
+                 'middle': 'q.', 'title': 'jr'},
+        'address': {'house': 57 + i, 'street': 'st. paul  st',
+                    'apartment': '#2b', 'city': 'rochester', 'state': 'ny',
+                    'zip': 14604},
+        'dob': datetime(1980, 6, 21), 'phones': ['(585) 555-0100'],
+        'emails': ['Robin.Wilt@Example.COM'], 'party': 'DEM',
+        'monroe_county_id': i, 'ny_state_id': 10 ** 9 + i,
+        'cksums': ['d1f8e40a'],
+    }
+
+
+def per_object_bytes(build, n):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [build(i) for i in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, 'lineno'))
+    return grown / len(kept)
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    docs = [harvest(i) for i in range(256)]
+    for doc in docs:
+        fast = Contact.from_harvest(doc, doc['cksums'][0])
+        slow = LegacyContact.from_harvest(doc, doc['cksums'][0])
+        assert dataclasses.astuple(fast) == dataclasses.astuple(slow)
+        assert dataclasses.astuple(fast) == dataclasses.astuple(
+            Contact(*dataclasses.astuple(slow)))
+
+    doc = docs[0]
+    raw = (doc['name']['first'], doc['name']['middle'], doc['name']['last'],
+           doc['name']['title'], *(doc['address'][field] for field in
+                                   ('house', 'street', 'apartment', 'city',
+                                    'state', 'zip')),
+           doc['phones'][0], doc['emails'][0], doc['dob'],
+           doc['monroe_county_id'], doc['ny_state_id'], 'd1f8e40a')
+    assert Contact(*raw) == Contact.from_harvest(doc, 'd1f8e40a')
+    cases = (
+        ('legacy from_harvest',
+         lambda: LegacyContact.from_harvest(doc, 'd1f8e40a')),
+        ('legacy LegacyContact()', lambda: LegacyContact(*raw)),
+        ('Contact(...)', lambda: Contact(*raw)),
+        ('Contact.from_harvest',
+         lambda: Contact.from_harvest(doc, 'd1f8e40a')),
+    )
+    for label, fn in cases:
+        us = min(timeit.repeat(fn, number=args.number, repeat=5))
+        print(f'{label:<22} {us / args.number * 1e6:>7.2f} us/object')
+    # both keep their own normalized strings; the gap is the instance dict
+    sizes = (('legacy', lambda i: LegacyContact.from_harvest(docs[i % 256],
+                                                            'd1f8e40a')),
+             ('slots', lambda i: Contact.from_harvest(docs[i % 256],
+                                                      'd1f8e40a')))
+    for label, build in sizes:
+        print(f'{label:<22} {per_object_bytes(build, args.number):>7.0f} '
+              'bytes/object')
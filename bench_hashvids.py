@@ -0,0 +1,51 @@
+import random
+import timeit
+from hashvids import hashvid, hashvids
+
+
+# rows hashvid takes and rows it raises on, which hashvids must mask out
+ODD = ('NYabc', 'NY', 'NY-5', 'NY+7', 'NY 12 ', 'NY1_000', 'ny42', 'XY42',
+       'NY000000000000000000', 'NY4294967295', 'NY4294967296',
+       'NY99999999999999999999', 'NY12.5', '', 'N')
+
+
+def sample_vids(n, seed=0):
+    rng = random.Random(seed)
+    vids = [f'NY{rng.randrange(10 ** 12):020d}' for _ in range(n)]
+    return vids + list(ODD)
+
+
+def scalar(vids):
+    ok, digests = [], []
+    for vid in vids:
+        try:
+            digests.append(hashvid(vid))
+        except ValueError:
+            ok.append(False)
+            continue
+        ok.append(True)
+    return ok, digests
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    vids = sample_vids(args.number)
+    want_ok, want = scalar(vids)
+    ok, got = hashvids(vids)
+    assert list(ok) == want_ok, [vid for vid, a, b in zip(vids, ok, want_ok)
+                                 if a != b]
+    assert got == want, 'batch digests differ from hashvid'
+    skipped = {vid for vid, kept in zip(vids, ok) if not kept}
+    assert {'NYabc', 'NY', '', 'N'} <= skipped, skipped
+    print(f'{sum(want_ok)} of {len(vids)} hashed, batch matches hashvid')
+
+    slow = min(timeit.repeat(lambda: scalar(vids), number=1, repeat=3))
+    fast = min(timeit.repeat(lambda: hashvids(vids), number=1, repeat=3))
+    print(f'{"hashvid":<10} {slow / len(vids) * 1e9:>8.0f} ns/vid')
+    print(f'{"hashvids":<10} {fast / len(vids) * 1e9:>8.0f} ns/vid'
+          f'  {slow / fast:.1f}x')
@@ -0,0 +1,59 @@
+import timeit
+from datetime import datetime
+from urllib.parse import urlencode, quote_plus as uriquote
+import render
+from main import Contact, PAGES, MOTOR_VOTER, ABSENTEE_FORM, REGSTAT_FORM
+
+
+def sample_contacts():
+    yield Contact('robin', 'q', 'wilt', 'jr', 57, 'st paul st', '2b',
+                  'rochester', 'ny', 14604, '5855550100',
+                  'Robin&Co<x>"@Example.com', datetime(1980, 6, 21),
+                  12345, 67890, 'd1f8e40a')
+    yield Contact("o'neil", '', 'van der berg', '', '12a', 'n. greece rd',
+                  '', 'greece', 'ny', '14626', '', '',
+                  datetime(1999, 1, 2), None, None, '00000000')
+
+
+def cases(contact):
+    residence = uriquote(f'{contact.house} {contact.street}, '
+                         f'{contact.zipcode}')
+    closest = uriquote('700 North St., Rochester, NY 14605')
+    center = urlencode({'house': contact.house, 'street': contact.street,
+                        'zip': contact.zipcode})
+    extras = {'residence': residence, 'closest': closest,
+              'center': center, 'key': 'k&<"'}
+    yield ('register', lambda: render.register(contact, MOTOR_VOTER),
+           lambda: PAGES['register'].render(contact))
+    yield ('absentee', lambda: render.absentee(contact, ABSENTEE_FORM),
+           lambda: PAGES['absentee'].render(contact))
+    yield ('regstat', lambda: render.regstat(contact, REGSTAT_FORM),
+           lambda: PAGES['regstat'].render(contact))
+    yield ('earlybird', lambda: render.earlybird(contact, **extras),
+           lambda: PAGES['earlybird'].render(contact, **extras))
+
+
+def bench(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    contacts = list(sample_contacts())
+    for contact in contacts:
+        for name, yattag, template in cases(contact):
+            assert yattag() == template(), f'{name} output differs'
+    print(f'{"page":<10} {"yattag us":>10} {"template us":>12} {"speedup":>8}'
+          f' {"gzip us":>8}')
+    for name, yattag, template in cases(contacts[0]):
+        slow = bench(yattag, args.number)
+        fast = bench(template, args.number)
+        page = template().encode('utf-8')
+        packed = bench(lambda: render.ENCODERS['gzip'](page), args.number)
+        print(f'{name:<10} {slow:>10.1f} {fast:>12.1f} {slow / fast:>7.1f}x'
+              f' {packed:>8.1f}')
@@ -0,0 +1,68 @@
+import math
+import timeit
+from sites import SiteIndex, EARTH_RADIUS
+
+
+# a fixed table, (lat, lng) as stored in early_polling_sites
+SITES = (
+    ('57 St. Paul St., 2nd Floor, Rochester, NY 14604', 43.1573, -77.6088),
+    ('700 North St., Rochester, NY 14605', 43.1700, -77.6010),
+    ('310 Arnett Blvd., Rochester, NY 14619', 43.1395, -77.6331),
+    ('10 Felix St., Rochester, NY 14608', 43.1628, -77.6464),
+    ('680 Westfall Rd., Rochester, NY 14620', 43.1180, -77.5840),
+    ('1039 N. Greece Rd., Rochester, NY 14626', 43.2440, -77.7160),
+    ('1 Miracle Mile Dr., Rochester, NY 14623', 43.0960, -77.6350),
+    ('1290 Titus Ave., Rochester, NY 14617', 43.1880, -77.5660),
+    ('3100 Atlantic Ave., Penfield, NY 14526', 43.1400, -77.4470),
+)
+# (lat, lng) -> sites expected nearest first
+EXPECTED = (
+    ((43.1570, -77.6090), ('57 St. Paul St., 2nd Floor, Rochester, NY 14604',
+                           '700 North St., Rochester, NY 14605')),
+    ((43.2400, -77.7100), ('1039 N. Greece Rd., Rochester, NY 14626',)),
+    ((43.1410, -77.4500), ('3100 Atlantic Ave., Penfield, NY 14526',
+                           '1290 Titus Ave., Rochester, NY 14617')),
+    ((43.0900, -77.6300), ('1 Miracle Mile Dr., Rochester, NY 14623',
+                           '680 Westfall Rd., Rochester, NY 14620')),
+)
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2)
+         * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def ranked(lat, lng):
+    return sorted(((address, haversine(lat, lng, slat, slng))
+                   for address, slat, slng in SITES), key=lambda r: r[1])
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    index = SiteIndex(SITES)
+    # one degree of longitude on the equator
+    equator = SiteIndex((('a', 0.0, 0.0),))
+    assert abs(equator.nearest(0.0, 1.0)[0][1] - 111195.08) < 0.01
+    for (lat, lng), expected in EXPECTED:
+        nearest = [address for address, _ in index.nearest(lat, lng, k=9)]
+        assert tuple(nearest[:len(expected)]) == expected, (lat, lng, nearest)
+        for (got, meters), (want, slow) in zip(index.nearest(lat, lng, k=9),
+                                               ranked(lat, lng)):
+            assert got == want and abs(meters - slow) < 1e-6, (got, want)
+    # out in Greece nothing else comes within a kilometre of the best
+    assert index.contenders(43.2400, -77.7100, 1000) == [EXPECTED[1][1][0]]
+    assert len(index.contenders(43.1570, -77.6090, 10 ** 5, k=9)) == 9
+    assert SiteIndex(()).contenders(43.0, -77.0, 1000) == []
+
+    lat, lng = EXPECTED[0][0]
+    for label, fn in (('python haversine', lambda: ranked(lat, lng)[:3]),
+                      ('SiteIndex.nearest', lambda: index.nearest(lat, lng))):
+        us = min(timeit.repeat(fn, number=args.number, repeat=5))
+        print(f'{label:<20} {us / args.number * 1e6:>7.2f} us/lookup')
@@ -0,0 +1,81 @@
+import math
+from array import array
+import numpy as np
+from cksumidx import key_of
+
+
+def mix(x):
+    x = ((x ^ (x >> 16)) * 0x45d9f3b) & 0xffffffff
+    x = ((x ^ (x >> 16)) * 0x45d9f3b) & 0xffffffff
+    return x ^ (x >> 16)
+
+
+def mix_u32(x):
+    # mix() over a uint32 array; the multiplies wrap the same way
+    x = np.asarray(x, dtype=np.uint32)
+    magic = np.uint32(0x45d9f3b)
+    x = (x ^ (x >> np.uint32(16))) * magic
+    x = (x ^ (x >> np.uint32(16))) * magic
+    return x ^ (x >> np.uint32(16))
+
+
+class BloomFilter(object):
+    # cksums are already fnv hashes, so they serve as the first hash and a
+    # remix of them as the double-hashing stride
+    def __init__(self, capacity, fp_rate=0.001):
+        capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.capacity = capacity
+        self.m = max(8, math.ceil(-capacity * math.log(fp_rate)
+                                  / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytes((self.m + 7) // 8)
+        self.size = 0
+        self.checks = 0
+        self.rejected = 0
+
+    @classmethod
+    def build(cls, keys, fp_rate=0.001, headroom=1.1):
+        keys = np.unique(np.asarray(keys, dtype=np.uint32))
+        bloom = cls(int(len(keys) * headroom), fp_rate)
+        bits = np.zeros(len(bloom.bits), dtype=np.uint8)
+        h1 = keys.astype(np.uint64)
+        h2 = (mix_u32(keys) | np.uint32(1)).astype(np.uint64)
+        m = np.uint64(bloom.m)
+        for i in range(bloom.k):
+            at = (h1 + np.uint64(i) * h2) % m
+            np.bitwise_or.at(bits, at >> np.uint64(3),
+                             np.left_shift(1, at & np.uint64(7))
+                             .astype(np.uint8))
+        bloom.bits = bits.tobytes()
+        bloom.size = len(keys)
+        return bloom
+
+    def __contains__(self, cksum):
+        self.checks += 1
+        key = key_of(cksum)
+        if key is not None:
+            stride = mix(key) | 1
+            bits, m = self.bits, self.m
+            for i in range(self.k):
+                at = (key + i * stride) % m
+                if not bits[at >> 3] & (1 << (at & 7)):
+                    break
+            else:
+                return True
+        self.rejected += 1
+        return False
+
+    def stats(self):
+        return {'size': self.size, 'bits': self.m, 'hashes': self.k,
+                'checks': self.checks, 'rejected': self.rejected}
+
+
+async def collect(cursor):
+    keys = array('I')
+    async for harvest in cursor:
+        for cksum in harvest.get('cksums', ()):
+            key = key_of(cksum)
+            if key is not None:
+                keys.append(key)
+    return np.frombuffer(keys, dtype=np.uint32)
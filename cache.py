@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+
+
+MISSING = object()
+
+
+class TTLCache(object):
+    # LRU with per-entry expiry; values may be None, so get() takes a default
+    def __init__(self, maxsize=65536, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=MISSING):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expiry, value = entry
+            if expiry is None or expiry > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value, ttl=MISSING):
+        if self.maxsize < 1:
+            return
+        if ttl is MISSING:
+            ttl = self.ttl
+        expiry = None if ttl is None else self.clock() + ttl
+        self._entries[key] = (expiry, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys):
+        if len(keys) == 0:
+            self._entries.clear()
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups > 0 else 0.0}
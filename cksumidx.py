@@ -0,0 +1,180 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from datetime import datetime
+import numpy as np
+
+
+MAGIC = b'CKSMIDX1'
+HEADER = struct.Struct('<8sQ')
+LENGTH = struct.Struct('<I')
+
+
+def key_of(cksum):
+    if len(cksum) != 8:
+        return
+    try:
+        return int(cksum, 16)
+    except ValueError:
+        return
+
+
+def encode(harvest):
+    record = dict(harvest)
+    record.pop('_id', None)
+    record.pop('cksums', None)
+    dob = record.get('dob')
+    if dob is not None:
+        record['dob'] = dob.strftime('%Y-%m-%d')
+    return json.dumps(record, separators=(',', ':')).encode('utf-8')
+
+
+def decode(blob):
+    harvest = json.loads(blob)
+    dob = harvest.get('dob')
+    if dob is not None:
+        harvest['dob'] = datetime.strptime(dob, '%Y-%m-%d')
+    return harvest
+
+
+class IndexWriter(object):
+    # <prefix>.dat holds length-prefixed records; <prefix>.idx a header,
+    # the sorted uint32 keys, then the matching uint64 record offsets
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.keys = array('I')
+        self.offsets = array('Q')
+        self.records = open(f'{prefix}.dat.tmp', 'wb')
+        self.offset = 0
+
+    def add(self, harvest):
+        keys = [key for key in map(key_of, harvest.get('cksums', ()))
+                if key is not None]
+        if len(keys) == 0:
+            return
+        blob = encode(harvest)
+        self.records.write(LENGTH.pack(len(blob)))
+        self.records.write(blob)
+        for key in keys:
+            self.keys.append(key)
+            self.offsets.append(self.offset)
+        self.offset += LENGTH.size + len(blob)
+
+    def close(self):
+        self.records.close()
+        keys = np.frombuffer(self.keys, dtype=np.uint32)
+        offsets = np.frombuffer(self.offsets, dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        with open(f'{self.prefix}.idx.tmp', 'wb') as ostrm:
+            ostrm.write(HEADER.pack(MAGIC, len(keys)))
+            ostrm.write(keys[order].astype('<u4').tobytes())
+            if len(keys) % 2 == 1:
+                ostrm.write(b'\0' * 4)
+            ostrm.write(offsets[order].astype('<u8').tobytes())
+        # servers holding the old maps keep reading the old inodes
+        os.replace(f'{self.prefix}.dat.tmp', f'{self.prefix}.dat')
+        os.replace(f'{self.prefix}.idx.tmp', f'{self.prefix}.idx')
+        return len(keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.records.close()
+
+
+class MmapIndex(object):
+    # read-only maps, so every server process shares the same page cache
+    def __init__(self, prefix):
+        self.prefix = prefix
+        with open(f'{prefix}.idx', 'rb') as istrm:
+            self.imap = mmap.mmap(istrm.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(f'{prefix}.dat', 'rb') as istrm:
+            self.rmap = (mmap.mmap(istrm.fileno(), 0, access=mmap.ACCESS_READ)
+                         if os.fstat(istrm.fileno()).st_size > 0 else b'')
+        magic, count = HEADER.unpack_from(self.imap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{prefix}.idx is not a cksum index')
+        self.count = count
+        self.keys = np.frombuffer(self.imap, dtype='<u4', count=count,
+                                  offset=HEADER.size)
+        at = HEADER.size + 4 * (count + count % 2)
+        self.offsets = np.frombuffer(self.imap, dtype='<u8', count=count,
+                                     offset=at)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.keys = self.offsets = None
+        for view in (self.imap, self.rmap):
+            if isinstance(view, mmap.mmap):
+                try:
+                    view.close()
+                except BufferError:
+                    # a Bloom rebuild still reads the keys; the map goes
+                    # with its last view instead
+                    pass
+
+    def find(self, cksum):
+        key = key_of(cksum)
+        if key is None:
+            return
+        i = int(np.searchsorted(self.keys, key))
+        if i == self.count or self.keys[i] != key:
+            return
+        at = int(self.offsets[i])
+        length, = LENGTH.unpack_from(self.rmap, at)
+        at += LENGTH.size
+        return decode(self.rmap[at:at + length])
+
+
+async def export_mongo(collection, prefix, fields):
+    reap = dict(fields, cksums=1)
+    with IndexWriter(prefix) as index:
+        async for harvest in collection.find({}, reap):
+            index.add(harvest)
+    return len(index.keys)
+
+
+def export_csv(istrm, prefix):
+    import csv
+    from voterfile import read_pe2020
+
+    with IndexWriter(prefix) as index:
+        for harvest in read_pe2020(csv.reader(istrm)):
+            index.add(harvest)
+    return len(index.keys)
+
+
+if __name__ == '__main__':
+    import asyncio
+    from sys import stdin
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('prefix')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--mongo')
+    source.add_argument('--csv', help='hashvids.py output, - for stdin')
+    args = parser.parse_args()
+
+    if args.csv is not None:
+        istrm = stdin if args.csv == '-' else open(args.csv, newline='')
+        with istrm:
+            written = export_csv(istrm, args.prefix)
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient as Mongo
+        from main import MONGO_URI, PE2020_FIELDS
+
+        async def export():
+            db = Mongo(args.mongo or MONGO_URI).get_default_database()
+            return await export_mongo(db.pe2020, args.prefix, PE2020_FIELDS)
+
+        written = asyncio.run(export())
+    print(f'{written} checksums indexed under {args.prefix}')
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import aiohttp
+from datetime import datetime, timedelta
+from urllib.parse import quote_plus as uriquote
+from pymongo import UpdateOne
+from cache import TTLCache, MISSING
+from metrics import UPSTREAM
+from geocoder import MAPS_API
+
+
+# the Distance Matrix API takes at most this many destinations per origin
+BATCH = 10
+
+
+def normalize(address):
+    return ' '.join(address.upper().replace(',', ' ').split())
+
+
+def calls(n):
+    return -(-n // BATCH)
+
+
+class DistanceMatrix(object):
+    # road distances by (origin, destination): memory LRU, then the
+    # distances collection, then the API for whatever pairs are left
+    def __init__(self, collection, key, maxsize=65536, ttl=30 * 86400,
+                 api=MAPS_API):
+        self.collection = collection
+        self.key = key
+        self.api = api
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize, ttl)
+        self.http = None
+        self.inflight = dict(())
+        self.lookups = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.coalesced = 0
+        self.upstream = 0
+        self.calls = 0
+        # API calls each measure() would have needed alone, less those it
+        # made; counted once it finishes so the total only ever grows
+        self.calls_avoided = 0
+
+    async def start(self):
+        self.http = aiohttp.ClientSession(raise_for_status=True)
+        try:
+            await self.collection.create_index('fetched',
+                                               expireAfterSeconds=self.ttl)
+        except Exception:
+            # an existing index with another expiry; reads still honour ttl
+            logging.warning('distances expiry index not updated',
+                            exc_info=True)
+        return self
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+
+    async def measure(self, origin, destinations):
+        # meters from origin to each destination, keyed as passed in;
+        # spellings that normalize alike share one lookup
+        names = dict(())
+        for dest in destinations:
+            names.setdefault(normalize(dest), []).append(dest)
+        origin = normalize(origin)
+        meters = dict(())
+        waits = dict(())
+        missing = []
+        made = 0
+        for dest in names:
+            self.lookups += 1
+            pair = (origin, dest)
+            distance = self.cache.get(pair)
+            if distance is not MISSING:
+                self.memory_hits += 1
+                meters[dest] = distance
+            elif pair in self.inflight:
+                self.coalesced += 1
+                waits[dest] = self.inflight[pair]
+            else:
+                missing.append(dest)
+        if len(missing) > 0:
+            own = task = asyncio.ensure_future(self.resolve(origin, missing))
+            for dest in missing:
+                self.inflight[(origin, dest)] = task
+                waits[dest] = task
+
+            def settled(_):
+                for dest in missing:
+                    if self.inflight.get((origin, dest)) is task:
+                        del self.inflight[(origin, dest)]
+            task.add_done_callback(settled)
+        for dest, task in waits.items():
+            meters[dest] = (await asyncio.shield(task))[0][dest]
+        if len(missing) > 0:
+            made = own.result()[1]
+        self.calls_avoided += calls(len(names)) - made
+        return {name: meters[dest] for dest in names for name in names[dest]}
+
+    async def resolve(self, origin, dests):
+        # (meters by destination, Distance Matrix calls made)
+        found = dict(())
+        # seconds until each stored distance expires, so the memory tier
+        # does not outlive the document it was read from
+        left = dict(())
+        now = datetime.utcnow()
+        fresh = now - timedelta(seconds=self.ttl)
+        cull = {'origin': origin, 'dest': {'$in': dests},
+                'fetched': {'$gt': fresh}}
+        reap = {'dest': 1, 'meters': 1, 'fetched': 1}
+        with UPSTREAM.time('mongo', 'distances'):
+            async for harvest in self.collection.find(cull, reap):
+                found[harvest['dest']] = harvest['meters']
+                left[harvest['dest']] = (harvest['fetched'] - fresh
+                                         ).total_seconds()
+        self.db_hits += len(found)
+        missing = [dest for dest in dests if dest not in found]
+        made = calls(len(missing))
+        if len(missing) > 0:
+            fetched = await self.fetch(origin, missing)
+            now = datetime.utcnow()
+            sows = [UpdateOne({'origin': origin, 'dest': dest},
+                              {'$set': {'meters': meters, 'fetched': now}},
+                              upsert=True)
+                    for dest, meters in fetched.items()]
+            await self.collection.bulk_write(sows, ordered=False)
+            found.update(fetched)
+        for dest in dests:
+            self.cache.put((origin, dest), found[dest],
+                           left.get(dest, MISSING))
+        return found, made
+
+    async def fetch(self, origin, dests):
+        batches = [dests[i:i + BATCH] for i in range(0, len(dests), BATCH)]
+
+        async def get(batch):
+            sites = '|'.join(map(uriquote, batch))
+            async with self.http.get(
+                    f'{self.api}distancematrix/json'
+                    f'?origins={uriquote(origin)}&destinations={sites}'
+                    f'&units=metric&key={self.key}') as rsp:
+                payload = await rsp.json()
+            elements = payload['rows'][0]['elements']
+            return {dest: int(element['distance']['value'])
+                    for dest, element in zip(batch, elements)}
+
+        self.calls += len(batches)
+        self.upstream += len(dests)
+        with UPSTREAM.time('google', 'distancematrix'):
+            fetched = dict(())
+            for distances in await asyncio.gather(*map(get, batches)):
+                fetched.update(distances)
+        return fetched
+
+    def stats(self):
+        return {'lookups': self.lookups, 'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits, 'coalesced': self.coalesced,
+                'upstream': self.upstream, 'calls': self.calls,
+                'calls_avoided': self.calls_avoided}
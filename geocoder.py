@@ -0,0 +1,87 @@
+import asyncio
+import aiohttp
+from urllib.parse import quote_plus as uriquote
+from cache import TTLCache, MISSING
+from metrics import UPSTREAM
+
+
+MAPS_API = 'https://maps.googleapis.com/maps/api/'
+
+
+class Geocoder(object):
+    # memory LRU in front of the geocache collection; concurrent misses on
+    # the same address share one upstream request
+    def __init__(self, collection, key, maxsize=65536, api=MAPS_API):
+        self.collection = collection
+        self.key = key
+        self.api = api
+        self.cache = TTLCache(maxsize, ttl=None)
+        self.http = None
+        self.inflight = dict(())
+        self.lookups = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.coalesced = 0
+        self.upstream = 0
+
+    async def start(self):
+        self.http = aiohttp.ClientSession(raise_for_status=True)
+        return self
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+
+    async def locate(self, house, street, postcode):
+        triplet = (house, street, postcode)
+        self.lookups += 1
+        coords = self.cache.get(triplet)
+        if coords is not MISSING:
+            self.memory_hits += 1
+            return coords
+        task = self.inflight.get(triplet)
+        if task is None:
+            task = asyncio.ensure_future(self.resolve(house, street, postcode))
+            self.inflight[triplet] = task
+            task.add_done_callback(
+                lambda _: self.inflight.pop(triplet, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def resolve(self, house, street, postcode):
+        cull = {'geo.type': 'Point',
+                'geo.coordinates': {'$exists': 1},
+                'address.house': house,
+                'address.street': street,
+                'address.zip': postcode}
+        reap = {'geo.coordinates': 1}
+        with UPSTREAM.time('mongo', 'geocache'):
+            harvest = await self.collection.find_one(cull, reap)
+        if harvest is not None:
+            self.db_hits += 1
+            lat, lng = harvest['geo']['coordinates']
+        else:
+            self.upstream += 1
+            address = uriquote(f'{house} {street}, {postcode}')
+            with UPSTREAM.time('google', 'geocode'):
+                async with self.http.get(
+                        f'{self.api}geocode/json'
+                        f'?address={address}&key={self.key}') as rsp:
+                    payload = await rsp.json()
+            latLng = payload['results'][0]['geometry']['location']
+            lat, lng = (float(latLng['lat']), float(latLng['lng']))
+            address = {'house': house, 'zip': postcode, 'street': street}
+            point = {'type': 'Point', 'coordinates': (lat, lng)}
+            sow = {'$set': {'address': address, 'geo': point}}
+            await self.collection.update_many(cull, sow, upsert=True)
+        self.cache.put((house, street, postcode), (lat, lng))
+        return (lat, lng)
+
+    def stats(self):
+        hits = self.memory_hits + self.db_hits
+        return {'lookups': self.lookups, 'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits, 'coalesced': self.coalesced,
+                'upstream': self.upstream,
+                'hit_ratio': hits / self.lookups if self.lookups > 0 else 0.0}
@@ -1,45 +1,297 @@
 import struct
 import itertools as it
+import hashlib
+import heapq
+import tempfile
+import collections
 import re
+import io
+import os
+import csv
+import numpy as np
+
+
+FNV_OFFSET_BASIS = 0x811c9dc5
+FNV_PRIME = 0x01000193
+STATEVID = re.compile('NY[0-9]+')
+# hex with at least one letter, or dates and other digit runs would tie
+CHECKSUM = re.compile('(?=[0-9]*[a-f])[0-9a-f]{8}')
 
 
 def hashvid(vid):
     # fnv—1a on the bits of the little-endian-packed voter ID int
-    fnv_offset_basis = 0x811c9dc5
-    fnv_prime = 0x01000193
-    fnv = fnv_offset_basis
+    fnv = FNV_OFFSET_BASIS
     for b in struct.pack('<I', int(vid[2:]) & 0xffffffff):
         fnv ^= b
-        fnv *= fnv_prime
+        fnv *= FNV_PRIME
         fnv &= 0xffffffff
     return struct.pack('<I', fnv).hex()
 
 
-def find_col_statevid(records):
-    head, snd = it.islice(records, 2)
-    records = it.chain((head, snd), records)
-    return next(i for i, cell in enumerate(snd)
-                if re.match('NY[0-9]+', cell) is not None)
+def vid_number(vid):
+    # the parse hashvid applies; None where it would raise
+    try:
+        return int(vid[2:])
+    except ValueError:
+        return None
+
+
+def parse_vids(vids):
+    # same parse as hashvid; rows that would raise ValueError are masked out
+    vids = tuple(vids)
+    ok = np.ones(len(vids), dtype=bool)
+    ints = np.zeros(len(vids), dtype=np.uint32)
+    for i, vid in enumerate(vids):
+        try:
+            ints[i] = int(vid[2:]) & 0xffffffff
+        except ValueError:
+            ok[i] = False
+    return ok, ints
+
+
+def fnv1a_u32(ints):
+    # fnv—1a over the four little-endian bytes of each uint32, column-wise
+    ints = np.asarray(ints, dtype=np.uint32)
+    fnv = np.full(ints.shape, FNV_OFFSET_BASIS, dtype=np.uint32)
+    prime = np.uint32(FNV_PRIME)
+    for shift in (0, 8, 16, 24):
+        fnv ^= (ints >> np.uint32(shift)) & np.uint32(0xff)
+        fnv *= prime
+    return fnv
+
+
+def hexdigests(fnvs):
+    blob = np.asarray(fnvs, dtype='<u4').tobytes().hex()
+    return [blob[i:i+8] for i in range(0, len(blob), 8)]
+
+
+def hashvids(vids):
+    ok, ints = parse_vids(vids)
+    return ok, hexdigests(fnv1a_u32(ints[ok]))
+
+
+def hash_records(records, statevid, chunk_size=65536):
+    records = iter(records)
+    while True:
+        chunk = list(it.islice(records, chunk_size))
+        if len(chunk) == 0:
+            return
+        ok, cksums = hashvids(record[statevid] for record in chunk)
+        cksums = iter(cksums)
+        for record, hashed in zip(chunk, ok):
+            if hashed:
+                record.append(next(cksums))
+                yield record
+
+
+def detect_col(records, pattern, window=256, min_rate=0.5):
+    # the column whose cells match most often over the first window rows;
+    # returns it with the sampled rows put back in front of the stream
+    records = iter(records)
+    sample = list(it.islice(records, window))
+    hits = collections.Counter()
+    for record in sample:
+        hits.update(i for i, cell in enumerate(record)
+                    if pattern.fullmatch(cell.strip()) is not None)
+    if len(hits) == 0:
+        raise ValueError(f'no column matches {pattern.pattern} in the '
+                         f'first {len(sample)} rows')
+    col, n = min(hits.items(), key=lambda hit: (-hit[1], hit[0]))
+    if n < min_rate * len(sample):
+        raise ValueError(f'best column for {pattern.pattern} is {col}, '
+                         f'matching {n} of {len(sample)} rows')
+    return col, it.chain(sample, records)
+
+
+def find_col_statevid(records, window=256):
+    return detect_col(records, STATEVID, window)
+
+
+def find_col_checksum(records, window=256):
+    return detect_col(records, CHECKSUM, window)
+
 
+def keyed(records, statevid):
+    # drops rows hashvid cannot take, such as a header or a short row
+    for record in records:
+        if len(record) > statevid and vid_number(record[statevid]) is not None:
+            yield record
 
-def find_col_checksum(records):
-    head, snd = it.islice(records, 2)
-    records = it.chain((head, snd), records)
-    return next(i for i, cell in enumerate(snd)
-                if re.match('[0-9a-f]{8}', cell))
+
+def sort_records(records, statevid, chunk_size=65536):
+    # external sort on the parsed state VID: sorted runs spill to
+    # temporary files and come back through a k-way merge
+    key = lambda record: vid_number(record[statevid])
+    records = iter(records)
+    runs = []
+    while True:
+        chunk = list(it.islice(records, chunk_size))
+        if len(chunk) == 0:
+            break
+        chunk.sort(key=key)
+        run = tempfile.TemporaryFile('w+', newline='')
+        csv.writer(run, dialect='unix').writerows(chunk)
+        run.seek(0)
+        runs.append(run)
+    return heapq.merge(*map(csv.reader, runs), key=key)
+
+
+def in_order(records, statevid, name):
+    # VIDs that parse to the same number are the same voter, as ingest.py
+    # keys on it; the merge join needs each to appear once per side
+    last = prev = None
+    for i, record in enumerate(records):
+        vid = vid_number(record[statevid])
+        if last is not None and vid == last:
+            raise ValueError(f'{name} has state VID {last} twice, at row {i} '
+                             f'({record[statevid]} after {prev})')
+        if last is not None and vid < last:
+            raise ValueError(f'{name} is not sorted by state VID at row {i} '
+                             f'({record[statevid]} after {prev}); '
+                             'pass --sort')
+        last, prev = vid, record[statevid]
+        yield record
+
+
+def row_digest(record):
+    blob = '\x1f'.join(record).encode('utf-8', 'surrogateescape')
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+def diff_records(old, new, statevid):
+    # merge join of two streams sorted by parsed state VID; both carry the
+    # checksum last, which depends on the VID only and is left out of the
+    # digest. yields (op, record), removals with the old record
+    old = ((vid_number(record[statevid]), record) for record in old)
+    new = ((vid_number(record[statevid]), record) for record in new)
+    (was, prev), (vid, cur) = next(old, (None, None)), next(new, (None, None))
+    while prev is not None or cur is not None:
+        if cur is None or (prev is not None and was < vid):
+            yield 'remove', prev
+            was, prev = next(old, (None, None))
+        elif prev is None or vid < was:
+            yield 'add', cur
+            vid, cur = next(new, (None, None))
+        else:
+            if row_digest(prev[:-1]) != row_digest(cur[:-1]):
+                yield 'change', cur
+            was, prev = next(old, (None, None))
+            vid, cur = next(new, (None, None))
+
+
+def split_rows(path, start, chunk_bytes):
+    # byte ranges of roughly chunk_bytes, each ending on a row boundary
+    end = os.path.getsize(path)
+    with open(path, 'rb') as istrm:
+        lo = start
+        while lo < end:
+            istrm.seek(min(lo + chunk_bytes, end))
+            istrm.readline()
+            hi = istrm.tell()
+            yield lo, hi
+            lo = hi
+
+
+def hash_range(job):
+    path, lo, hi, statevid, chunk_size = job
+    with open(path, 'rb') as istrm:
+        istrm.seek(lo)
+        blob = istrm.read(hi - lo)
+    istrm = csv.reader(io.StringIO(
+        blob.decode('utf-8', 'surrogateescape'), newline=''))
+    ostrm = io.StringIO(newline='')
+    steno = csv.writer(ostrm, dialect='unix')
+    records = keyed(istrm, statevid)
+    steno.writerows(hash_records(records, statevid, chunk_size))
+    return ostrm.getvalue().encode('utf-8', 'surrogateescape')
+
+
+def hash_file(path, ostrm, workers, chunk_bytes=1 << 26, chunk_size=65536,
+              window=256):
+    # rows must not span lines (no quoted newlines) for the byte-range split
+    from multiprocessing import Pool
+
+    with open(path, 'rb') as istrm:
+        lines = list(it.islice(istrm, window))
+    records = csv.reader(line.decode('utf-8', 'surrogateescape')
+                         for line in lines)
+    statevid, _ = find_col_statevid(records, window)
+    # keyed() drops a header row wherever it lands
+    jobs = ((path, lo, hi, statevid, chunk_size)
+            for lo, hi in split_rows(path, 0, chunk_bytes))
+    # imap would queue every range at once and hold finished chunks until
+    # their turn; keep about two per process in flight and write in order
+    pending = collections.deque()
+    with Pool(workers) as pool:
+        for job in jobs:
+            if len(pending) >= 2 * workers:
+                ostrm.write(pending.popleft().get())
+            pending.append(pool.apply_async(hash_range, (job,)))
+        while len(pending) > 0:
+            ostrm.write(pending.popleft().get())
 
 
 if __name__ == '__main__':
-    import csv
-    from sys import stdin, stdout
-
-    steno = csv.writer(stdout, dialect='unix')
-    istrm = csv.reader(stdin)
-    head = next(istrm)
-    statevid = find_col_statevid(istrm)
-    for record in istrm:
-        try:
-            record.append(hashvid(record[statevid]))
-        except ValueError:
-            continue
-        steno.writerow(record)
+    from sys import stdin, stdout, stderr
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('input', nargs='?')
+    parser.add_argument('-o', '--output')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--chunk-bytes', type=int, default=1 << 26)
+    parser.add_argument('--sample', type=int, default=256,
+                        help='rows sampled to find the state VID column')
+    parser.add_argument('--delta', metavar='PREVIOUS',
+                        help='previous output of this script; write only '
+                        'rows added, changed or removed since, each '
+                        'prefixed with the op, for ingest.py --delta')
+    parser.add_argument('--sort', action='store_true',
+                        help='sort both inputs by state VID for --delta '
+                        'instead of requiring them sorted')
+    args = parser.parse_args()
+
+    if args.delta is not None:
+        istrm = (open(args.input, newline='') if args.input is not None
+                 else stdin)
+        ostrm = (open(args.output, 'w', newline='')
+                 if args.output is not None else stdout)
+        with istrm, ostrm, open(args.delta, newline='') as pstrm:
+            steno = csv.writer(ostrm, dialect='unix')
+            statevid, new = find_col_statevid(csv.reader(istrm), args.sample)
+            new = keyed(new, statevid)
+            old = keyed(csv.reader(pstrm), statevid)
+            if args.sort:
+                new = sort_records(new, statevid, args.chunk_size)
+                old = sort_records(old, statevid, args.chunk_size)
+            new = hash_records(in_order(new, statevid, args.input or 'stdin'),
+                               statevid, args.chunk_size)
+            old = in_order(old, statevid, args.delta)
+            tally = dict.fromkeys(('add', 'change', 'remove'), 0)
+            for op, record in diff_records(old, new, statevid):
+                tally[op] += 1
+                steno.writerow([op] + record)
+        stderr.write(' '.join(f'{op} {n}' for op, n in tally.items()) + '\n')
+        exit()
+
+    if args.workers > 1:
+        if args.input is None:
+            stderr.write('fatal: --workers needs a seekable input file\n')
+            exit(1)
+        ostrm = (open(args.output, 'wb') if args.output is not None
+                 else stdout.buffer)
+        with ostrm:
+            hash_file(args.input, ostrm, args.workers,
+                      args.chunk_bytes, args.chunk_size, args.sample)
+        exit()
+
+    istrm = (open(args.input, newline='') if args.input is not None
+             else stdin)
+    ostrm = (open(args.output, 'w', newline='') if args.output is not None
+             else stdout)
+    with istrm, ostrm:
+        steno = csv.writer(ostrm, dialect='unix')
+        statevid, records = find_col_statevid(csv.reader(istrm), args.sample)
+        steno.writerows(hash_records(keyed(records, statevid), statevid,
+                                     args.chunk_size))
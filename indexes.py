@@ -0,0 +1,109 @@
+import logging
+
+
+# (collection, keys) the handlers and batch jobs rely on
+INDEXES = (
+    ('pe2020', [('cksums', 1)]),
+    ('pe2020', [('ny_state_id', 1)]),
+    ('geocache', [('address.house', 1), ('address.street', 1),
+                  ('address.zip', 1)]),
+    ('geocache', [('geo', '2dsphere')]),
+    ('early_polling', [('residence', 1), ('site', 1)]),
+    ('early_polling_sites', [('geo', '2dsphere')]),
+    ('distances', [('origin', 1), ('dest', 1)]),
+    ('tag_queue', [('leased', 1), ('queued', 1)]),
+)
+
+
+def query_shapes(sites):
+    # (name, collection, filter, sort) as issued at request time; the
+    # values are placeholders, only the shape matters to the planner
+    triplet = {'house': 0, 'street': '', 'zip': 0}
+    return (
+        ('find_by_id', 'pe2020', {'cksums': {'$in': ['00000000']}}, None),
+        ('ingest', 'pe2020', {'ny_state_id': 0}, None),
+        ('geocache', 'geocache', {'geo.type': 'Point',
+                                  'geo.coordinates': {'$exists': 1},
+                                  'address.house': 0, 'address.street': '',
+                                  'address.zip': 0}, None),
+        ('early_polling', 'early_polling',
+         {'residence': triplet, 'site': {'$in': list(sites)}}, None),
+        ('distances', 'distances', {'origin': '', 'dest': {'$in': ['']},
+                                    'fetched': {'$gt': 0}}, None),
+        ('nb_people', 'nb_people', {'_id': '00000000'}, None),
+        ('tag_queue', 'tag_queue', {'leased': {'$lt': 0}}, [('queued', 1)]),
+    )
+
+
+def stages(plan):
+    # stage names of an explain plan, outermost first; tolerates the
+    # classic and slot-based layouts
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            name = plan['stage']
+            if 'indexName' in plan:
+                name = f"{name} {plan['indexName']}"
+            yield name
+        for key in ('queryPlan', 'inputStage', 'inputStages'):
+            if key in plan:
+                yield from stages(plan[key])
+    elif isinstance(plan, list):
+        for step in plan:
+            yield from stages(step)
+
+
+async def ensure(db):
+    for name, keys in INDEXES:
+        index = await db[name].create_index(keys)
+        logging.info('index %s.%s ok', name, index)
+
+
+async def explain(db, sites):
+    # returns the names of query shapes that would scan their collection
+    scans = []
+    for name, collection, cull, sort in query_shapes(sites):
+        cursor = db[collection].find(cull).limit(1)
+        if sort is not None:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        plan = list(stages(plan['queryPlanner']['winningPlan']))
+        count = await db[collection].estimated_document_count()
+        logging.info('%s: %s over ~%d documents', name, ' <- '.join(plan),
+                     count)
+        if any(stage.startswith('COLLSCAN') for stage in plan):
+            scans.append(name)
+            logging.error('%s scans all ~%d documents of %s', name, count,
+                          collection)
+    return scans
+
+
+async def bootstrap(db, sites, create=True, strict=False):
+    if create:
+        await ensure(db)
+    scans = await explain(db, sites)
+    if len(scans) > 0 and strict:
+        raise RuntimeError(f'collection scans: {", ".join(scans)}')
+    return scans
+
+
+if __name__ == '__main__':
+    import asyncio
+    from argparse import ArgumentParser
+    from motor.motor_asyncio import AsyncIOMotorClient as Mongo
+    from main import MONGO_URI, EARLY_POLLING_SITES
+
+    parser = ArgumentParser()
+    parser.add_argument('--mongo', default=MONGO_URI)
+    parser.add_argument('--check-only', action='store_true',
+                        help='explain the query shapes without creating '
+                        'any index')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        db = Mongo(args.mongo).get_default_database()
+        return await bootstrap(db, EARLY_POLLING_SITES,
+                               create=not args.check_only)
+
+    exit(1 if len(asyncio.run(run())) > 0 else 0)
@@ -0,0 +1,158 @@
+import asyncio
+import collections
+import csv
+import itertools
+import logging
+import time
+from pymongo import UpdateOne, DeleteOne
+from voterfile import layout, is_header, read_pe2020
+
+
+JOB = 'ingest'
+
+
+def upsert(doc):
+    # keyed on the state id: checksums accumulate and phones or emails
+    # gathered elsewhere survive a reload of the voter file
+    cksums = doc.pop('cksums')
+    fresh = {'phones': doc.pop('phones'), 'emails': doc.pop('emails')}
+    sow = {'$set': doc, '$setOnInsert': fresh,
+           '$addToSet': {'cksums': {'$each': cksums}}}
+    return UpdateOne({'ny_state_id': doc['ny_state_id']}, sow, upsert=True)
+
+
+def delta_ops(records, cols):
+    # rows of hashvids.py --delta: the op, then the hashed record. a removal
+    # only needs the state VID, so the rest of the old row need not parse
+    for record in records:
+        op, record = record[0], record[1:]
+        if op == 'remove':
+            try:
+                stvid = int(record[cols['SBOEID']].strip()[2:])
+            except (IndexError, ValueError):
+                logging.warning('cannot remove %s: no state VID', record)
+                continue
+            yield DeleteOne({'ny_state_id': stvid})
+            continue
+        for doc in read_pe2020((record,), cols):
+            yield upsert(doc)
+
+
+def counted(records, tally):
+    for record in records:
+        tally[0] += 1
+        yield record
+
+
+async def flush(collection, ops, gate):
+    try:
+        rsp = await collection.bulk_write(ops, ordered=False)
+        return rsp.upserted_count + rsp.modified_count + rsp.deleted_count
+    finally:
+        gate.release()
+
+
+async def ingest(db, records, job=JOB, batch_size=1000, inflight=4,
+                 restart=False, every=5, delta=False):
+    await db.pe2020.create_index('ny_state_id')
+    await db.pe2020.create_index('cksums')
+    checkpoint = None if restart else await db.jobs.find_one({'_id': job})
+    done = 0 if checkpoint is None else checkpoint['rows']
+    records = iter(records)
+    head = next(records, None)
+    if head is None:
+        return 0
+    if is_header(head[1:] if delta else head):
+        cols = layout(head[1:] if delta else head)
+    else:
+        cols = layout()
+        records = itertools.chain([head], records)
+    if done > 0:
+        logging.info('%s: resuming after row %d', job, done)
+    tally = [done]
+    records = counted(itertools.islice(records, done, None), tally)
+    if delta:
+        ops = delta_ops(records, cols)
+    else:
+        ops = map(upsert, read_pe2020(records, cols))
+    gate = asyncio.Semaphore(inflight)
+    # batches finish out of order; the checkpoint only moves past a row
+    # once every batch before it has been written too
+    pending = collections.deque()
+    written = 0
+    began = last_report = time.monotonic()
+    last_rows = done
+
+    async def settle(block):
+        nonlocal done, written
+        moved = False
+        while len(pending) > 0 and (block or pending[0][1].done()):
+            end, task = pending.popleft()
+            written += await task
+            done, moved = end, True
+        if moved:
+            sow = {'$set': {'rows': done}}
+            await db.jobs.update_one({'_id': job}, sow, upsert=True)
+
+    try:
+        while True:
+            batch = list(itertools.islice(ops, batch_size))
+            if len(batch) == 0:
+                break
+            await gate.acquire()
+            task = asyncio.ensure_future(flush(db.pe2020, batch, gate))
+            pending.append((tally[0], task))
+            await settle(False)
+            now = time.monotonic()
+            if now - last_report >= every:
+                rate = (tally[0] - last_rows) / (now - last_report)
+                logging.info('%s: %d rows, %d written, %.0f rows/s', job,
+                             done, written, rate)
+                last_report, last_rows = now, tally[0]
+        await settle(True)
+    except BaseException:
+        # let the batches already sent land before giving up
+        await asyncio.gather(*(task for _, task in pending),
+                             return_exceptions=True)
+        raise
+    elapsed = time.monotonic() - began
+    logging.info('%s: %d rows, %d written in %.1fs', job, done, written,
+                 elapsed)
+    # finished: the next run of this job starts from the top
+    await db.jobs.delete_one({'_id': job})
+    return written
+
+
+if __name__ == '__main__':
+    import os
+    from sys import stdin
+    from argparse import ArgumentParser
+    from motor.motor_asyncio import AsyncIOMotorClient as Mongo
+    from main import MONGO_URI
+
+    parser = ArgumentParser()
+    parser.add_argument('input', help='hashvids.py output, - for stdin')
+    parser.add_argument('--mongo', default=MONGO_URI)
+    parser.add_argument('--job', help='checkpoint name; defaults to one '
+                        'derived from the input file name')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--inflight', type=int, default=4,
+                        help='bulk writes outstanding at once')
+    parser.add_argument('--restart', action='store_true')
+    parser.add_argument('--delta', action='store_true',
+                        help='input is a hashvids.py --delta file')
+    args = parser.parse_args()
+    job = args.job
+    if job is None:
+        job = f'{JOB}:{os.path.basename(args.input)}'
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        db = Mongo(args.mongo).get_default_database()
+        istrm = stdin if args.input == '-' else open(args.input, newline='')
+        with istrm:
+            await ingest(db, csv.reader(istrm), job, args.batch_size,
+                         args.inflight, args.restart, delta=args.delta)
+
+    asyncio.run(run())
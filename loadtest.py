@@ -0,0 +1,241 @@
+import asyncio
+import random
+import socket
+import time
+import aiohttp
+from collections import Counter, defaultdict
+from datetime import datetime
+from multiprocessing import Process
+from aiohttp import web
+from pymongo import MongoClient
+import main
+from main import Contact, EARLY_POLLING_SITES
+from hashvids import hashvid
+
+
+ROUTES = {
+    'apply': '/{hash}',
+    'status': '/{hash}/status',
+    'earlybird': '/{hash}/earlybird',
+    'vote': '/{hash}/vote',
+}
+STREETS = ('Main St', 'Lake Ave', 'Monroe Ave', 'Culver Rd', 'Park Ave',
+           'East Ave', 'Dewey Ave', 'Genesee St', 'Chili Ave', 'Hudson Ave')
+
+
+def synthetic_voter(i, rng):
+    stvid = 10 ** 9 + i
+    return {
+        'cksums': [hashvid(f'NY{stvid:018}')],
+        'name': {'first': rng.choice(('ada', 'grace', 'alan', 'edsger')),
+                 'last': f'voter{i}', 'middle': 'q', 'title': ''},
+        'address': {'house': rng.randrange(1, 2000),
+                    'street': rng.choice(STREETS), 'apartment': '',
+                    'city': 'rochester', 'state': 'ny',
+                    'zip': rng.choice((14604, 14605, 14607, 14620))},
+        'dob': datetime(rng.randrange(1930, 2002), rng.randrange(1, 13),
+                        rng.randrange(1, 29)),
+        'phones': ['5855550100'], 'emails': [f'voter{i}@example.com'],
+        'party': 'DEM', 'monroe_county_id': i, 'ny_state_id': stvid,
+    }
+
+
+def seed(uri, voters, geocached, rng):
+    db = MongoClient(uri).get_default_database()
+    for name in ('pe2020', 'geocache', 'early_polling', 'early_polling_sites',
+                 'tag_queue', 'nb_people'):
+        db.drop_collection(name)
+    docs = [synthetic_voter(i, rng) for i in range(voters)]
+    db.pe2020.insert_many(docs)
+    db.pe2020.create_index('cksums')
+    sites = [{'address': address,
+              'geo': {'type': 'Point',
+                      'coordinates': (43.15 + rng.uniform(-0.1, 0.1),
+                                      -77.6 + rng.uniform(-0.15, 0.15))}}
+             for address in EARLY_POLLING_SITES]
+    db.early_polling_sites.insert_many(sites)
+    db.early_polling_sites.create_index([('geo', '2dsphere')])
+    cached = []
+    for doc in docs[:int(voters * geocached)]:
+        contact = Contact.from_harvest(doc, doc['cksums'][0])
+        address = {'house': contact.house, 'zip': contact.zipcode,
+                   'street': contact.street}
+        point = {'type': 'Point',
+                 'coordinates': (43.15 + rng.uniform(-0.1, 0.1),
+                                 -77.6 + rng.uniform(-0.15, 0.15))}
+        cached.append({'address': address, 'geo': point})
+    if len(cached) > 0:
+        db.geocache.insert_many(cached)
+    return [doc['cksums'][0] for doc in docs]
+
+
+def mock_app(nb_latency, nb_throttle, maps_latency, maps_throttle):
+    async def stall(latency, throttle):
+        await asyncio.sleep(random.expovariate(1 / latency)
+                            if latency > 0 else 0)
+        if random.random() < throttle:
+            raise web.HTTPTooManyRequests(headers={'Retry-After': '1'})
+
+    async def handle(req):
+        path = req.path
+        if '/api/v1/' in path:
+            await stall(nb_latency, nb_throttle)
+            if path.endswith('/people/search'):
+                uid = hash(req.query.get('custom_values')) & 0xffffff
+                return web.json_response({'results': [{'id': uid}]})
+            if path.endswith('/taggings'):
+                return web.json_response({'taggings': []})
+        if '/maps/api/' in path:
+            await stall(maps_latency, maps_throttle)
+            if path.endswith('/geocode/json'):
+                location = {'lat': 43.15 + random.uniform(-0.1, 0.1),
+                            'lng': -77.6 + random.uniform(-0.15, 0.15)}
+                return web.json_response(
+                    {'results': [{'geometry': {'location': location}}]})
+            if path.endswith('/distancematrix/json'):
+                sites = req.query.get('destinations', '').split('|')
+                elements = [{'distance': {'value': random.randrange(10 ** 4)}}
+                            for _ in sites]
+                return web.json_response({'rows': [{'elements': elements}]})
+        raise web.HTTPNotFound()
+
+    app = web.Application()
+    app.add_routes([web.route('*', '/{tail:.*}', handle)])
+    return app
+
+
+def serve_mocks(port, opts):
+    app = mock_app(opts.nb_latency, opts.nb_429, opts.maps_latency,
+                   opts.maps_429)
+    web.run_app(app, host='127.0.0.1', port=port, print=None)
+
+
+def serve_app(port, mock_port, opts):
+    mocks = f'http://127.0.0.1:{mock_port}'
+    args = main.make_parser().parse_args([
+        '--debug', '--log', '/dev/null', '--port', str(port),
+        '--mongo', opts.mongo, '--nb-api', f'{mocks}/api/v1/',
+        '--maps-api', f'{mocks}/maps/api/', *opts.app_args])
+    main.configure(args)
+    main.NB_TOKEN = main.DM_TOKEN = 'bench'
+    main.DB = main.Mongo(args.mongo).get_default_database()
+    web.run_app(main.make_app(args), host='127.0.0.1', port=port,
+                print=None)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def await_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f'nothing listening on {port}')
+
+
+async def drive(base, cksums, opts):
+    mix = dict((name, float(weight)) for name, weight in
+               (part.split('=') for part in opts.mix.split(',')))
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    deadline = time.monotonic() + opts.duration
+    connector = aiohttp.TCPConnector(limit=opts.concurrency)
+
+    async def worker(http):
+        while time.monotonic() < deadline:
+            route = random.choices(names, weights)[0]
+            if random.random() < opts.unknown:
+                cksum = f'{random.getrandbits(32):08x}'
+            else:
+                cksum = random.choice(cksums)
+            uri = base + ROUTES[route].format(hash=cksum)
+            began = time.perf_counter()
+            try:
+                async with http.get(uri, allow_redirects=False) as rsp:
+                    await rsp.read()
+                    status = rsp.status
+            except aiohttp.ClientError:
+                status = 'error'
+            latencies[route].append(time.perf_counter() - began)
+            statuses[route][status] += 1
+
+    async with aiohttp.ClientSession(connector=connector) as http:
+        began = time.monotonic()
+        await asyncio.gather(*(worker(http) for _ in range(opts.concurrency)))
+        elapsed = time.monotonic() - began
+    return latencies, statuses, elapsed
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(latencies, statuses, elapsed):
+    print(f'{"route":<10} {"reqs":>7} {"req/s":>8} {"p50 ms":>8} '
+          f'{"p95 ms":>8} {"p99 ms":>8}  statuses')
+    total = 0
+    for route in sorted(latencies):
+        ordered = sorted(latencies[route])
+        total += len(ordered)
+        p50, p95, p99 = (percentile(ordered, q) * 1e3
+                         for q in (0.5, 0.95, 0.99))
+        codes = ' '.join(f'{code}:{n}' for code, n in
+                         sorted(statuses[route].items(), key=str))
+        print(f'{route:<10} {len(ordered):>7} {len(ordered) / elapsed:>8.1f} '
+              f'{p50:>8.1f} {p95:>8.1f} {p99:>8.1f}  {codes}')
+    print(f'{"total":<10} {total:>7} {total / elapsed:>8.1f}')
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser, REMAINDER
+
+    parser = ArgumentParser()
+    parser.add_argument('--mongo', default='mongodb://localhost/regstatd_bench')
+    parser.add_argument('--voters', type=int, default=10000)
+    parser.add_argument('--geocached', type=float, default=0.5)
+    parser.add_argument('--no-seed', action='store_true')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--mix', default='apply=5,status=2,earlybird=2,vote=1')
+    parser.add_argument('--unknown', type=float, default=0.05)
+    parser.add_argument('--nb-latency', type=float, default=0.15)
+    parser.add_argument('--nb-429', type=float, default=0.02)
+    parser.add_argument('--maps-latency', type=float, default=0.2)
+    parser.add_argument('--maps-429', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=2020)
+    parser.add_argument('app_args', nargs=REMAINDER)
+    opts = parser.parse_args()
+    if opts.app_args[:1] == ['--']:
+        opts.app_args = opts.app_args[1:]
+
+    rng = random.Random(opts.seed)
+    if opts.no_seed:
+        db = MongoClient(opts.mongo).get_default_database()
+        cksums = [doc['cksums'][0] for doc in
+                  db.pe2020.find({}, {'cksums': 1}).limit(opts.voters)]
+    else:
+        cksums = seed(opts.mongo, opts.voters, opts.geocached, rng)
+    mock_port, app_port = free_port(), free_port()
+    mocks = Process(target=serve_mocks, args=(mock_port, opts), daemon=True)
+    app = Process(target=serve_app, args=(app_port, mock_port, opts),
+                  daemon=True)
+    mocks.start()
+    app.start()
+    try:
+        await_port(mock_port)
+        await_port(app_port)
+        results = asyncio.run(drive(f'http://127.0.0.1:{app_port}',
+                                    cksums, opts))
+        report(*results)
+    finally:
+        app.terminate()
+        mocks.terminate()
@@ -0,0 +1,166 @@
+import time
+from bisect import bisect_left
+from aiohttp import web
+
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+REGISTRY = []
+
+
+def labelled(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if len(pairs) == 0:
+        return ''
+    body = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                                     .replace('"', r'\"')
+                                     .replace('\n', r'\n'))
+                    for name, value in pairs)
+    return '{' + body + '}'
+
+
+class Timer(object):
+    __slots__ = ('histogram', 'labels', 'began')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.began, *self.labels)
+
+
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = dict(())
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1),
+                                            0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, *labels):
+        return Timer(self, labels)
+
+    def samples(self):
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = (('le', bound if bound == '+Inf' else repr(float(bound))),)
+                yield (f'{self.name}_bucket'
+                       f'{labelled(self.labels, labels, le)}', cumulative)
+            yield f'{self.name}_sum{labelled(self.labels, labels)}', total
+            yield f'{self.name}_count{labelled(self.labels, labels)}', cumulative
+
+
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = dict(())
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.series.items()):
+            yield f'{self.name}{labelled(self.labels, labels)}', value
+
+
+class Gauge(object):
+    # read at scrape time: fn returns a number, or a dict of label tuples
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return
+        if values is None:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{labelled(self.labels, labels)}', value
+
+
+class Total(Gauge):
+    # read at scrape time like Gauge, for totals that only ever grow
+    kind = 'counter'
+
+
+def exposition():
+    lines = []
+    for metric in REGISTRY:
+        samples = list(metric.samples())
+        if len(samples) == 0:
+            continue
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(f'{sample} {value}' for sample, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+REQUESTS = Histogram('regstatd_request_duration_seconds',
+                     'Handler latency by route and status.',
+                     ('route', 'status'))
+UPSTREAM = Histogram('regstatd_upstream_duration_seconds',
+                     'Latency of calls to Mongo, NationBuilder and Google.',
+                     ('upstream', 'op'))
+RENDER = Histogram('regstatd_render_duration_seconds',
+                   'Time spent filling and compressing HTML pages.',
+                   ('stage', 'page'))
+
+
+def route_of(req):
+    resource = req.match_info.route.resource
+    if resource is None:
+        return 'unmatched'
+    return resource.canonical
+
+
+@web.middleware
+async def middleware(req, handler):
+    began = time.perf_counter()
+    status = 500
+    try:
+        rsp = await handler(req)
+        status = rsp.status
+        return rsp
+    except web.HTTPException as exc:
+        status = exc.status
+        raise
+    finally:
+        REQUESTS.observe(time.perf_counter() - began, route_of(req),
+                         str(status))
+
+
+async def serve(req):
+    return web.Response(text=exposition(),
+                        content_type='text/plain; version=0.0.4')
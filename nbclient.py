@@ -0,0 +1,148 @@
+import asyncio
+import random
+import time
+import aiohttp
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlencode
+
+
+NB_API = 'https://wiltforcongress.nationbuilder.com/api/v1/'
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst, clock=time.monotonic):
+        if burst < 1 or rate <= 0:
+            # acquire() waits for a whole token, which would never come
+            raise ValueError(f'token bucket needs burst >= 1 and rate > 0, '
+                             f'not {burst} and {rate}')
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.stamp = clock()
+        self.blocked_until = 0
+        self._lock = None
+
+    def block(self, delay):
+        # the server asked us to back off: nobody gets a token until then
+        self.blocked_until = max(self.blocked_until, self.clock() + delay)
+        self.tokens = 0
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                elapsed = now - self.stamp
+                self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_after(rsp):
+    value = rsp.headers.get('Retry-After')
+    if value is None:
+        return
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        then = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return
+    return max(0.0, then - time.time())
+
+
+class NationBuilder(object):
+    # one pooled keep-alive session per app, rate limited on our side so NB
+    # rarely has to tell us to slow down
+    def __init__(self, token, base=NB_API, rate=10, burst=10, pool=16,
+                 retries=5, backoff=1, max_backoff=60, timeout=30):
+        self.token = token
+        self.base = base
+        self.bucket = TokenBucket(rate, burst)
+        self.pool = pool
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.http = None
+        self.calls = 0
+        self.in_flight = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.pool,
+                                         keepalive_timeout=75)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        self.http = aiohttp.ClientSession(
+            connector=connector, timeout=timeout,
+            headers={'Accept': 'application/json'})
+        return self
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+
+    def delay(self, attempt):
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return ceiling * (0.5 + random.random() / 2)
+
+    async def request(self, path, method='GET', payload=None, **kwargs):
+        uri = f'{self.base}{path}?access_token={self.token}'
+        q = urlencode(kwargs)
+        if q != '':
+            uri += f'&{q}'
+        headers = dict(())
+        if method != 'GET':
+            headers['Content-Type'] = 'application/json'
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            self.calls += 1
+            self.in_flight += 1
+            try:
+                async with self.http.request(method, uri, json=payload,
+                                             headers=headers) as rsp:
+                    if rsp.status in (429, 403) or 499 < rsp.status < 600:
+                        if attempt >= self.retries:
+                            self.failed += 1
+                            rsp.raise_for_status()
+                        delay = retry_after(rsp)
+                        if rsp.status in (429, 403):
+                            self.throttled += 1
+                            if delay is not None:
+                                self.bucket.block(delay)
+                        if delay is None:
+                            delay = self.delay(attempt)
+                    elif rsp.status not in range(200, 300):
+                        self.failed += 1
+                        rsp.raise_for_status()
+                    else:
+                        return await rsp.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    self.failed += 1
+                    raise
+                delay = self.delay(attempt)
+            finally:
+                self.in_flight -= 1
+            attempt += 1
+            self.retried += 1
+            await asyncio.sleep(min(delay, self.max_backoff))
+
+    def stats(self):
+        return {'calls': self.calls, 'in_flight': self.in_flight,
+                'throttled': self.throttled, 'retried': self.retried,
+                'failed': self.failed}
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from urllib.parse import parse_qsl
+from motor.motor_asyncio import AsyncIOMotorClient as Mongo
+from pymongo import UpdateOne
+from hashvids import hashvid
+from nbclient import NationBuilder
+from main import MONGO_URI
+
+
+def person_cksum(person):
+    cksum = person.get('crc32')
+    if cksum is not None and str(cksum).strip() != '':
+        return str(cksum).lower().strip()
+    stvid = person.get('state_file_id')
+    if stvid is None or not stvid.startswith('NY'):
+        return
+    try:
+        return hashvid(stvid)
+    except ValueError:
+        return
+
+
+def next_page(href):
+    # NB hands back '/api/v1/people?__nonce=...&__token=...&limit=...'
+    if href is None:
+        return None, None
+    path, _, q = href.partition('?')
+    path = path[path.index('/api/v1') + len('/api/v1'):]
+    return path, dict(parse_qsl(q))
+
+
+async def prefetch(db, nb, limit=100):
+    seen = mapped = 0
+    path, query = '/people', {'limit': limit}
+    while path is not None:
+        rsp = await nb.request(path, **query)
+        people = rsp.get('results', [])
+        ops = []
+        for person in people:
+            cksum = person_cksum(person)
+            if cksum is None or person.get('id') is None:
+                continue
+            sow = {'$set': {'nb_id': person['id']}}
+            ops.append(UpdateOne({'_id': cksum}, sow, upsert=True))
+        if len(ops) > 0:
+            await db.nb_people.bulk_write(ops, ordered=False)
+        seen += len(people)
+        mapped += len(ops)
+        logging.info('%d people paged, %d ids mapped', seen, mapped)
+        path, query = next_page(rsp.get('next'))
+    return mapped
+
+
+if __name__ == '__main__':
+    from sys import stderr
+    from os import getenv
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('--nb-token', required=False)
+    parser.add_argument('--mongo', default=MONGO_URI)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--nb-rate', type=float, default=10)
+    args = parser.parse_args()
+    token = args.nb_token
+    if token is None:
+        token = (getenv('NB_TOKEN') or '').strip()
+        if token == '':
+            stderr.write('fatal: no NB_TOKEN specified\n')
+            exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        db = Mongo(args.mongo).get_default_database()
+        nb = await NationBuilder(token, rate=args.nb_rate,
+                                 burst=max(1, int(args.nb_rate))).start()
+        try:
+            await prefetch(db, nb, args.page_size)
+        finally:
+            await nb.close()
+
+    asyncio.run(main())
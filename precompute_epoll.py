@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from motor.motor_asyncio import AsyncIOMotorClient as Mongo
+from pymongo import UpdateOne
+import main
+from main import (Contact, EARLY_POLLING_SITES, PE2020_FIELDS, MONGO_URI,
+                  residence_of, nearest_site, walk_pe2020, token)
+from geocoder import Geocoder
+from distances import DistanceMatrix
+from sites import SiteIndex
+
+
+JOB = 'precompute_epoll'
+
+
+async def settle(db, batch, gate):
+    contacts = dict(())
+    for _, _, contact in await Contact.from_cursor(batch):
+        triplet = residence_of(contact)
+        contacts.setdefault(tuple(triplet.values()), contact)
+    triplets = [residence_of(contact) for contact in contacts.values()]
+    cull = {'residence': {'$in': triplets},
+            'site': {'$in': EARLY_POLLING_SITES}}
+    async for harvest in db.early_polling.find(cull, {'residence': 1}):
+        residence = harvest['residence']
+        contacts.pop((residence['house'], residence['street'],
+                      residence['zip']), None)
+
+    async def locate(contact):
+        async with gate:
+            try:
+                return contact, await nearest_site(contact)
+            except Exception:
+                logging.exception('no site for %s %s, %s', contact.house,
+                                  contact.street, contact.zipcode)
+                return contact, None
+
+    located = await asyncio.gather(*map(locate, contacts.values()))
+    sows = []
+    for contact, closest in located:
+        if closest is None:
+            continue
+        triplet = residence_of(contact)
+        cull = {'residence': triplet, 'site': {'$in': EARLY_POLLING_SITES}}
+        sow = {'$set': {'residence': triplet, 'site': closest}}
+        sows.append(UpdateOne(cull, sow, upsert=True))
+    if len(sows) > 0:
+        await db.early_polling.bulk_write(sows, ordered=False)
+    return len(sows)
+
+
+async def precompute(db, batch_size=500, concurrency=8, restart=False):
+    gate = asyncio.Semaphore(concurrency)
+    written = 0
+    began = time.monotonic()
+    async for batch, state in walk_pe2020(db, JOB, PE2020_FIELDS, batch_size,
+                                          restart):
+        written += await settle(db, batch, gate)
+        elapsed = time.monotonic() - began
+        logging.info('%d voters walked, %d residences written, %.0f/s',
+                     state['seen'], written, len(batch) / max(elapsed, 1e-9))
+        began = time.monotonic()
+    return written
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('--dm-token', required=False)
+    parser.add_argument('--mongo', default=MONGO_URI)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--restart', action='store_true')
+    parser.add_argument('--road-margin', type=float, default=0)
+    args = parser.parse_args()
+    main.DM_TOKEN = token(args.dm_token, 'DM_TOKEN')
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        main.DB = Mongo(args.mongo).get_default_database()
+        main.GEOCODER = await Geocoder(main.DB.geocache,
+                                       main.DM_TOKEN).start()
+        main.DISTANCES = await DistanceMatrix(main.DB.distances,
+                                              main.DM_TOKEN).start()
+        main.SITES = await SiteIndex.load(main.DB.early_polling_sites)
+        main.ROAD_MARGIN = args.road_margin
+        try:
+            await precompute(main.DB, args.batch_size, args.concurrency,
+                             args.restart)
+        finally:
+            await main.DISTANCES.close()
+            await main.GEOCODER.close()
+
+    asyncio.run(run())
@@ -0,0 +1,175 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import time
+from motor.motor_asyncio import AsyncIOMotorClient as Mongo
+import main
+from main import (Contact, EARLY_POLLING_SITES, PE2020_FIELDS, MONGO_URI,
+                  PAGES, HEX8, residence_of, static_path, earlybird_page,
+                  walk_pe2020, token)
+
+
+JOB = 'prerender'
+
+
+def fingerprint(*templates):
+    # pages are rebuilt whenever the markup around the slots changes
+    digest = hashlib.sha1()
+    for template in templates:
+        for literal, _, _ in template.chunks:
+            digest.update(literal.encode('utf-8'))
+        digest.update(template.tail.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def source_digest(harvest, closest, salt):
+    doc = {key: value for key, value in harvest.items() if key != '_id'}
+    blob = json.dumps([doc, closest, salt], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+def replace(path, body):
+    with open(f'{path}.tmp', 'wb') as ostrm:
+        ostrm.write(body)
+    os.replace(f'{path}.tmp', path)
+
+
+def compress(body):
+    # mtime=0 keeps the bytes stable across runs for the same page;
+    # gzip.compress only takes mtime from 3.8 on
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9,
+                       mtime=0) as ostrm:
+        ostrm.write(body)
+    return buf.getvalue()
+
+
+def write_pages(root, cksum, pages, digest, run):
+    # the stamp's mtime records the last walk that produced this cksum
+    stamp = os.path.join(os.path.dirname(static_path(root, cksum, '')),
+                         'digest')
+    try:
+        with open(stamp) as istrm:
+            if istrm.read() == digest:
+                os.utime(stamp, (run, run))
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(stamp), exist_ok=True)
+    for name in PAGES:
+        path = f'{static_path(root, cksum, name)}.gz'
+        if name not in pages:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        replace(path, compress(pages[name].encode('utf-8')))
+    replace(stamp, digest.encode('utf-8'))
+    os.utime(stamp, (run, run))
+    return True
+
+
+def prune(root, run):
+    # drop the pages of cksums the finished walk did not produce, so a
+    # voter removed from pe2020 stops being served from disk
+    pruned = 0
+    for outer in os.scandir(root):
+        if not outer.is_dir():
+            continue
+        for inner in os.scandir(outer.path):
+            if not inner.is_dir():
+                continue
+            for entry in os.scandir(inner.path):
+                if not entry.is_dir():
+                    continue
+                try:
+                    stale = os.stat(os.path.join(entry.path,
+                                                 'digest')).st_mtime < run
+                except FileNotFoundError:
+                    stale = True
+                if stale:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    pruned += 1
+    return pruned
+
+
+def hex_cksums(harvest):
+    for cksum in harvest.get('cksums', ()):
+        cksum = str(cksum).lower()
+        if HEX8.fullmatch(cksum) is not None:
+            yield cksum
+
+
+async def sites_of(db, contacts):
+    triplets = [residence_of(contact) for contact in contacts]
+    cull = {'residence': {'$in': triplets},
+            'site': {'$in': EARLY_POLLING_SITES}}
+    sites = dict(())
+    async for harvest in db.early_polling.find(cull, {'residence': 1,
+                                                      'site': 1}):
+        residence = harvest['residence']
+        key = residence['house'], residence['street'], residence['zip']
+        sites[key] = harvest['site']
+    return sites
+
+
+async def prerender(db, root, batch_size=500, restart=False):
+    salt = [fingerprint(*PAGES.values()), main.DM_TOKEN]
+    run = int(time.time())
+    written = 0
+    began = time.monotonic()
+    reap = dict(PE2020_FIELDS, cksums=1)
+    loop = asyncio.get_event_loop()
+    # a resumed walk keeps the start time of the one it continues
+    async for batch, state in walk_pe2020(db, JOB, reap, batch_size, restart,
+                                          run=run):
+        run = state['run']
+        contacts = await Contact.from_cursor(batch, hex_cksums)
+        sites = await sites_of(db, [contact for _, _, contact in contacts])
+        jobs = []
+        for harvest, cksum, contact in contacts:
+            triplet = residence_of(contact)
+            closest = sites.get(tuple(triplet.values()))
+            digest = source_digest(harvest, closest, salt)
+            pages = {'absentee': PAGES['absentee'].render(contact),
+                     'regstat': PAGES['regstat'].render(contact)}
+            if closest is not None:
+                pages['earlybird'] = earlybird_page(contact, closest)
+            jobs.append((root, cksum, pages, digest, run))
+
+        def flush():
+            return sum(write_pages(*job) for job in jobs)
+        written += await loop.run_in_executor(None, flush)
+        elapsed = time.monotonic() - began
+        logging.info('%d voters walked, %d rewritten, %.0f/s', state['seen'],
+                     written, len(batch) / max(elapsed, 1e-9))
+        began = time.monotonic()
+    pruned = await loop.run_in_executor(None, prune, root, run)
+    logging.info('%d stale voters pruned', pruned)
+    return written
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('root', help='directory for main.py --static')
+    parser.add_argument('--dm-token', required=False)
+    parser.add_argument('--mongo', default=MONGO_URI)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--restart', action='store_true')
+    args = parser.parse_args()
+    main.DM_TOKEN = token(args.dm_token, 'DM_TOKEN')
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        main.DB = Mongo(args.mongo).get_default_database()
+        await prerender(main.DB, args.root, args.batch_size, args.restart)
+
+    asyncio.run(run())
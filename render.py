@@ -0,0 +1,234 @@
+import dataclasses
+import gzip
+import re
+from datetime import date
+from aiohttp import web
+from yattag import Doc
+from yattag.simpledoc import html_escape, attr_escape
+from metrics import RENDER
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# encodings we may emit, in order of preference; set from the CLI
+COMPRESS = ()
+ENCODERS = {'gzip': lambda body: gzip.compress(body, 6)}
+if brotli is not None:
+    ENCODERS['br'] = lambda body: brotli.compress(body, quality=5)
+
+SENTINEL = re.compile('\x00([0-9]+)\x00')
+
+
+class Slot(str):
+    # stands in for a value while a page is built once with yattag; its
+    # text is a sentinel that survives escaping so it can be found again
+    def __new__(cls, resolvers, resolve):
+        self = str.__new__(cls, f'\x00{len(resolvers)}\x00')
+        resolvers.append(resolve)
+        self.resolvers = resolvers
+        self.resolve = resolve
+        return self
+
+
+class DateSlot(Slot):
+    def part(self, name):
+        resolve = self.resolve
+        return Slot(self.resolvers,
+                    lambda contact, extras: getattr(resolve(contact, extras),
+                                                    name))
+
+    @property
+    def month(self):
+        return self.part('month')
+
+    @property
+    def day(self):
+        return self.part('day')
+
+    @property
+    def year(self):
+        return self.part('year')
+
+    def strftime(self, fmt):
+        resolve = self.resolve
+        return Slot(self.resolvers,
+                    lambda contact, extras: resolve(contact,
+                                                    extras).strftime(fmt))
+
+
+def field_resolver(name):
+    return lambda contact, extras: getattr(contact, name)
+
+
+def extra_resolver(name):
+    return lambda contact, extras: extras[name]
+
+
+class Template(object):
+    def __init__(self, build, cls, *extras, **static):
+        self.name = build.__name__
+        resolvers = []
+        blank = object.__new__(cls)
+        for field in dataclasses.fields(cls):
+            kind = DateSlot if field.type is date else Slot
+            setattr(blank, field.name,
+                    kind(resolvers, field_resolver(field.name)))
+        slots = {name: Slot(resolvers, extra_resolver(name))
+                 for name in extras}
+        page = build(blank, **slots, **static)
+        parts = SENTINEL.split(page)
+        self.chunks = []
+        markup = ''
+        for i in range(0, len(parts) - 1, 2):
+            markup += parts[i]
+            in_tag = markup.rfind('<') > markup.rfind('>')
+            escape = attr_escape if in_tag else html_escape
+            resolve = resolvers[int(parts[i + 1])]
+            self.chunks.append((parts[i], resolve, escape))
+        self.tail = parts[-1]
+
+    def render(self, contact, **extras):
+        with RENDER.time('fill', self.name):
+            out = []
+            for literal, resolve, escape in self.chunks:
+                out.append(literal)
+                out.append(escape(resolve(contact, extras)))
+            out.append(self.tail)
+            return ''.join(out)
+
+
+def accepted(req):
+    encodings = set()
+    for token in req.headers.get('Accept-Encoding', '').split(','):
+        encoding, _, params = token.partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def respond(req, page):
+    encodings = accepted(req) if len(COMPRESS) > 0 else ()
+    for encoding in COMPRESS:
+        if encoding in encodings and encoding in ENCODERS:
+            with RENDER.time('compress', encoding):
+                body = ENCODERS[encoding](page.encode('utf-8'))
+            rsp = web.Response(body=body, content_type='text/html',
+                               charset='utf-8')
+            rsp.headers['Content-Encoding'] = encoding
+            rsp.headers['Vary'] = 'Accept-Encoding'
+            return rsp
+    return web.Response(text=page, content_type='text/html')
+
+
+def register(contact, endpoint):
+    doc, tag, text = Doc().tagtext()
+    doc.asis('<!DOCTYPE html>')
+    with tag('head'):
+        with tag('title'):
+            text('Voter Registration')
+        with tag('script', type='text/javascript'):
+            text('''
+                window.onload = function() {
+                    document.getElementById('rtv').submit();
+                }
+                ''')
+        with tag('form', method='post', action=endpoint, id='rtv'):
+            keys = ('DOB', 'email', 'sEmail', 'zip', 'terms')
+            vals = (contact.dob.strftime('%m/%d/%Y'),
+                    contact.email, contact.email, contact.zipcode, 'on')
+            for key, val in zip(keys, vals):
+                doc.input(type='hidden', value=val, name=key)
+    return doc.getvalue()
+
+
+def absentee(contact, endpoint):
+    doc, tag, text = Doc().tagtext()
+    doc.asis('<!DOCTYPE html>')
+    with tag('head'):
+        with tag('title'):
+            text(f"{contact.forename}'s Mail-in Ballot Application")
+        with tag('script', type='text/javascript'):
+            text('''
+                 window.onload = function() {
+                    document.getElementById('abs-ballot-app').submit()
+                 }
+                 ''')
+        with tag('form', method='post', action=endpoint, id='abs-ballot-app'):
+            for key, val in contact.form_data():
+                doc.input(type='hidden', value=val, name=key)
+    return doc.getvalue()
+
+
+def regstat(contact, endpoint):
+    doc, tag, text = Doc().tagtext()
+    doc.asis('<!DOCTYPE html>')
+    with tag('head'):
+        with tag('title'):
+            text('Absentee Ballot Status')
+        with tag('script', type='text/javascript'):
+            text('''
+                 window.onload = function() {
+                    document.getElementById('regstat').submit()
+                 }
+                 ''')
+        with tag('form', method='post', action=endpoint, id='regstat'):
+            keys = ('lname', 'dobm', 'dobd', 'doby', 'no', 'sname', 'zip')
+            vals = (contact.surname, contact.dob.month, contact.dob.day,
+                    contact.dob.year, contact.house, contact.street,
+                    contact.zipcode)
+            for key, val in zip(keys, vals):
+                doc.input(type='hidden', value=val, name=f'v[{key}]')
+    return doc.getvalue()
+
+
+def earlybird(contact, residence, closest, center, key):
+    doc, tag, text = Doc().tagtext()
+    doc.asis('<!DOCTYPE html>')
+    with tag('head'):
+        with tag('title'):
+            text(f"{contact.forename}'s Early Polling Sites")
+
+        with tag('script'):
+            text('''
+                 const msg = (
+                     'The Board of Elections is encouraging all who have waited ' +
+                     'over a week for their absentee ballot to consider voting ' +
+                     'in person at _any_ early polling site through Sunday, June ' +
+                     '21. Click OK to see the closest site to your registered ' +
+                     'address and a list of all early voting sites.');
+                 alert(msg);
+                 ''')
+        with tag('style'):
+            text('''
+                 a { text-decoration: none;
+                     color: #4287f5;
+                     font-size: xx-large;
+                     padding: 0.5em;
+                     font-family: Roboto, Arial, 'sans-serif'; }
+                 a:hover { color: #1bf5ee; }
+                 div.flex { display: flex;
+                            float: center;
+                            margin: auto;
+                            width: 80%;
+                            height: 100vh;
+                            padding: 2em;
+                            flex-direction: column; }
+                 ''')
+    with tag('body'):
+        closest_src = (r'https://www.google.com/maps/embed/v1/directions'
+                       f'?origin={residence}&destination={closest}&key={key}')
+        browse_src = f'/earlybird_sites?{center}'
+        with tag('div', klass='flex'):
+            with tag('a', href=f'https://google.com/maps/place/{closest}'):
+                text(r'Closest early polling to '
+                     f'{contact.house} {contact.street}')
+            with tag('iframe', src=closest_src, height='50%'):
+                pass
+            with tag('a', href=browse_src):
+                text('Browse all early polling sites')
+            with tag('iframe', src=browse_src, height='50%'):
+                pass
+    return doc.getvalue()
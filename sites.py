@@ -0,0 +1,51 @@
+import numpy as np
+
+
+EARTH_RADIUS = 6371008.8
+
+
+class SiteIndex(object):
+    # the whole site table fits in a few cache lines: rank it with a
+    # vectorized haversine instead of asking $near and then the Maps API
+    def __init__(self, sites):
+        sites = tuple(sites)
+        self.addresses = tuple(address for address, _, _ in sites)
+        coords = np.radians(np.array([(lat, lng) for _, lat, lng in sites],
+                                     dtype=np.float64).reshape(-1, 2))
+        self.lat = coords[:, 0].copy()
+        self.lng = coords[:, 1].copy()
+        self.cos_lat = np.cos(self.lat)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    @classmethod
+    async def load(cls, collection):
+        # coordinates are stored (lat, lng), same as geocache and $near
+        sites = []
+        reap = {'address': 1, 'geo.coordinates': 1}
+        async for site in collection.find({}, reap):
+            lat, lng = site['geo']['coordinates']
+            sites.append((site['address'], float(lat), float(lng)))
+        return cls(sites)
+
+    def distances(self, lat, lng):
+        lat, lng = np.radians(lat), np.radians(lng)
+        dlat = np.sin((self.lat - lat) / 2)
+        dlng = np.sin((self.lng - lng) / 2)
+        a = dlat * dlat + np.cos(lat) * self.cos_lat * dlng * dlng
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def nearest(self, lat, lng, k=3):
+        meters = self.distances(lat, lng)
+        order = np.argsort(meters, kind='stable')[:k]
+        return [(self.addresses[i], float(meters[i])) for i in order]
+
+    def contenders(self, lat, lng, margin, k=3):
+        # sites whose straight-line distance is within margin of the best
+        ranked = self.nearest(lat, lng, k)
+        if len(ranked) == 0:
+            return []
+        best = ranked[0][1]
+        return [address for address, meters in ranked
+                if meters - best <= margin]
@@ -0,0 +1,174 @@
+import logging
+import os
+import select
+import signal
+import time
+
+
+def describe(status):
+    if os.WIFSIGNALED(status):
+        try:
+            name = signal.Signals(os.WTERMSIG(status)).name
+        except ValueError:
+            name = f'signal {os.WTERMSIG(status)}'
+        return f'was killed by {name}'
+    return f'exited with status {os.WEXITSTATUS(status)}'
+
+
+class Supervisor(object):
+    # forks workers that each run target(ready) and share the listening port
+    # with SO_REUSEPORT; a worker calls ready() once it is accepting
+    def __init__(self, target, workers, drain=10, startup=60, poll=0.5,
+                 backoff=1, max_backoff=60):
+        self.target = target
+        self.workers = workers
+        self.drain = drain
+        self.startup = startup
+        self.poll = poll
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # failures since the workers last stayed up for max_backoff seconds
+        self.streak = 0
+        self.resume = 0
+        self.pids = dict(())
+        self.rolling = False
+        self.stopping = False
+        self.spawned = 0
+        self.crashed = 0
+
+    def spawn(self):
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(rfd)
+            for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            # until the worker's loop installs its own reload handler
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+            status = 0
+            try:
+                self.target(lambda: os.write(wfd, b'.'))
+            except BaseException:
+                logging.exception('worker %d failed', os.getpid())
+                status = 1
+            finally:
+                os._exit(status)
+        os.close(wfd)
+        self.pids[pid] = rfd
+        self.spawned += 1
+        return pid
+
+    def await_ready(self, pid):
+        rfd = self.pids[pid]
+        ready, _, _ = select.select([rfd], [], [], self.startup)
+        # a worker that dies during startup closes the pipe: EOF, not ready
+        return len(ready) > 0 and len(os.read(rfd, 1)) > 0
+
+    def forget(self, pid):
+        os.close(self.pids.pop(pid))
+
+    def terminate(self, pid):
+        os.kill(pid, signal.SIGTERM)
+        self.collect(pid)
+
+    def collect(self, pid):
+        deadline = time.monotonic() + self.drain + self.startup
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done != 0:
+                break
+            time.sleep(0.1)
+        else:
+            logging.warning('worker %d ignored SIGTERM, killing it', pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.forget(pid)
+
+    def failed(self):
+        # respawns back off exponentially while workers keep dying
+        now = time.monotonic()
+        if now - self.resume > self.max_backoff:
+            self.streak = 0
+        self.streak += 1
+        delay = min(self.max_backoff, self.backoff * 2 ** (self.streak - 1))
+        self.resume = max(self.resume, now + delay)
+        logging.warning('respawning in %.1fs after %d failures', delay,
+                        self.streak)
+
+    def launch(self):
+        pid = self.spawn()
+        if self.await_ready(pid):
+            logging.info('worker %d ready', pid)
+            return pid
+        logging.error('worker %d did not come up', pid)
+        self.failed()
+        try:
+            self.terminate(pid)
+        except ChildProcessError:
+            self.forget(pid)
+
+    def roll(self):
+        # one at a time, the replacement accepting before the old one drains
+        for pid in list(self.pids):
+            if self.stopping:
+                return
+            if self.launch() is None:
+                logging.error('rolling restart abandoned')
+                return
+            logging.info('draining worker %d', pid)
+            try:
+                self.terminate(pid)
+            except ChildProcessError:
+                self.forget(pid)
+
+    def reap(self):
+        while len(self.pids) > 0:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.pids:
+                self.crashed += 1
+                logging.error('worker %d %s', pid, describe(status))
+                self.forget(pid)
+                self.failed()
+
+    def forward(self, sig, frame):
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        def stop(sig, frame):
+            self.stopping = True
+
+        def rollover(sig, frame):
+            self.rolling = True
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, rollover)
+        signal.signal(signal.SIGUSR1, self.forward)
+        while not self.stopping:
+            self.reap()
+            if self.rolling:
+                self.rolling = False
+                logging.info('rolling restart of %d workers', len(self.pids))
+                self.roll()
+            for _ in range(self.workers - len(self.pids)):
+                if (self.stopping or time.monotonic() < self.resume
+                        or self.launch() is None):
+                    break
+            time.sleep(self.poll)
+        for pid in list(self.pids):
+            os.kill(pid, signal.SIGTERM)
+        for pid in list(self.pids):
+            try:
+                self.collect(pid)
+            except ChildProcessError:
+                self.forget(pid)
+        logging.info('supervisor done: %d spawned, %d crashed',
+                     self.spawned, self.crashed)
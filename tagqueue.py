@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from pymongo import ReturnDocument
+
+
+Tagee = namedtuple('Tagee', ('cksum', 'stvid', 'ctyvid'))
+
+
+class TagQueue(object):
+    # pending tags live in mongo, one document per person: repeat clicks
+    # coalesce into a single taggings call and nothing is lost on restart
+    def __init__(self, collection, handler, workers=4, maxsize=100000,
+                 lease=300, poll=5, attempts=5, recount=10):
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.lease = lease
+        self.poll = poll
+        self.attempts = attempts
+        self.recount = recount
+        # shared by every server process; put and process adjust it between
+        # recounts so the cap reacts to this process's own traffic
+        self.depth = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.done = 0
+        self.failed = 0
+        self.abandoned = 0
+        self._wake = None
+        self._tasks = []
+
+    async def start(self):
+        await self.collection.create_index([('leased', 1), ('queued', 1)])
+        self.depth = await self.collection.estimated_document_count()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self.work())
+                       for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self.count()))
+        return self
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, contact, *tags):
+        if self.depth >= self.maxsize:
+            self.dropped += 1
+            logging.warning('tag queue full (%d), dropped %s for %s',
+                            self.depth, tags, contact.cksum)
+            return False
+        # Contact title-cases its cksum; queue on the hex everything else uses
+        cull = {'_id': contact.cksum.lower()}
+        sow = {'$addToSet': {'tags': {'$each': list(tags)}},
+               '$setOnInsert': {'queued': time.time(), 'leased': 0}}
+        ids = {'stvid': contact.stvid, 'ctyvid': contact.ctyvid}
+        ids = {key: value for key, value in ids.items() if value is not None}
+        if len(ids) > 0:
+            sow['$set'] = ids
+        rsp = await self.collection.update_one(cull, sow, upsert=True)
+        if rsp.upserted_id is not None:
+            self.depth += 1
+        self.enqueued += 1
+        self._wake.set()
+        return True
+
+    async def count(self):
+        while True:
+            await asyncio.sleep(self.recount)
+            try:
+                self.depth = await self.collection.estimated_document_count()
+            except Exception:
+                logging.exception('tag queue recount failed')
+
+    async def claim(self):
+        now = time.time()
+        return await self.collection.find_one_and_update(
+            {'leased': {'$lt': now}},
+            {'$set': {'leased': now + self.lease}, '$inc': {'attempts': 1}},
+            sort=[('queued', 1)], return_document=ReturnDocument.AFTER)
+
+    async def work(self):
+        while True:
+            self._wake.clear()
+            try:
+                entry = await self.claim()
+            except Exception:
+                logging.exception('tag queue claim failed')
+                entry = None
+            if entry is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(entry)
+            except Exception:
+                # the lease still lapses, so the entry comes around again
+                logging.exception('tag queue bookkeeping failed for %s',
+                                  entry['_id'])
+
+    async def process(self, entry):
+        tags = entry.get('tags', [])
+        tagee = Tagee(entry['_id'], entry.get('stvid'), entry.get('ctyvid'))
+        try:
+            if len(tags) > 0:
+                await self.handler(tagee, *tags)
+        except Exception:
+            self.failed += 1
+            logging.exception('tagging %s with %s failed', tagee.cksum, tags)
+            if entry.get('attempts', 0) < self.attempts:
+                # the lease stays put, so this entry is retried once it lapses
+                return
+            logging.error('giving up on tagging %s with %s after %d attempts',
+                          tagee.cksum, tags, entry['attempts'])
+            rsp = await self.collection.delete_one({'_id': entry['_id']})
+            self.depth -= rsp.deleted_count
+            self.abandoned += 1
+            return
+        cull = {'_id': entry['_id']}
+        sow = {'$pullAll': {'tags': tags},
+               '$set': {'leased': 0, 'attempts': 0}}
+        await self.collection.update_one(cull, sow)
+        cull['tags'] = {'$size': 0}
+        rsp = await self.collection.delete_one(cull)
+        self.depth -= rsp.deleted_count
+        self.done += 1
+
+    def stats(self):
+        return {'depth': self.depth, 'enqueued': self.enqueued,
+                'dropped': self.dropped, 'done': self.done,
+                'failed': self.failed, 'abandoned': self.abandoned}
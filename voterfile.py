@@ -0,0 +1,75 @@
+from datetime import datetime
+
+
+# column order of the statewide voter file the board of elections sends
+NYS_COLUMNS = (
+    'LASTNAME', 'FIRSTNAME', 'MIDDLENAME', 'NAMESUFFIX', 'RADDNUMBER',
+    'RHALFCODE', 'RAPARTMENT', 'RPREDIRECTION', 'RSTREETNAME',
+    'RPOSTDIRECTION', 'RCITY', 'RZIP5', 'RZIP4', 'MAILADD1', 'MAILADD2',
+    'MAILADD3', 'MAILADD4', 'DOB', 'GENDER', 'ENROLLMENT', 'OTHERPARTY',
+    'COUNTYCODE', 'ED', 'LD', 'TOWNCITY', 'WARD', 'CD', 'SD', 'AD',
+    'LASTVOTEDDATE', 'PREVYEARVOTED', 'PREVCOUNTY', 'PREVADDRESS',
+    'PREVNAME', 'COUNTYVRNUMBER', 'REGDATE', 'VRSOURCE', 'IDREQUIRED',
+    'IDMET', 'STATUS', 'REASONCODE', 'INACT_DATE', 'PURGE_DATE', 'SBOEID',
+    'VoterHistory',
+)
+# hashvids.py appends the checksum as the last column
+CKSUM = 'CKSUM'
+
+
+def layout(header=None, overrides=()):
+    # column name -> index; a header row wins over the statewide order
+    columns = header if header is not None else NYS_COLUMNS
+    cols = {name.strip().upper(): i for i, name in enumerate(columns)}
+    cols.setdefault(CKSUM, -1)
+    for name, index in overrides:
+        cols[name.strip().upper()] = int(index)
+    return cols
+
+
+def is_header(record):
+    names = {cell.strip().upper() for cell in record}
+    return 'SBOEID' in names or 'LASTNAME' in names
+
+
+def intish(s):
+    s = s.strip()
+    return int(s) if s.isdigit() else s
+
+
+def to_pe2020(record, cols):
+    cell = lambda name: record[cols[name]].strip()
+    street = ' '.join(part for part in (cell('RPREDIRECTION'),
+                                        cell('RSTREETNAME'),
+                                        cell('RPOSTDIRECTION')) if part)
+    stvid = cell('SBOEID')
+    ctyvid = cell('COUNTYVRNUMBER')
+    return {
+        'cksums': [cell(CKSUM).lower()],
+        'name': {'first': cell('FIRSTNAME'), 'last': cell('LASTNAME'),
+                 'middle': cell('MIDDLENAME'), 'title': cell('NAMESUFFIX')},
+        'address': {'house': intish(cell('RADDNUMBER')), 'street': street,
+                    'apartment': cell('RAPARTMENT'), 'city': cell('RCITY'),
+                    'state': 'NY', 'zip': intish(cell('RZIP5'))},
+        'dob': datetime.strptime(cell('DOB'), '%Y%m%d'),
+        'phones': [],
+        'emails': [],
+        'party': cell('ENROLLMENT'),
+        'monroe_county_id': int(ctyvid) if ctyvid.isdigit() else None,
+        'ny_state_id': int(stvid[2:]),
+    }
+
+
+def read_pe2020(records, cols=None):
+    # yields pe2020 documents, skipping rows that do not parse
+    records = iter(records)
+    for record in records:
+        if cols is None:
+            if is_header(record):
+                cols = layout(record)
+                continue
+            cols = layout()
+        try:
+            yield to_pe2020(record, cols)
+        except (IndexError, KeyError, ValueError):
+            continue